@@ -8,7 +8,13 @@
 #
 
 import binascii
+import hashlib
+import os
 import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 
 from matchcode_toolkit.halohash import BitAverageHaloHash
 
@@ -25,22 +31,49 @@ def _create_directory_fingerprint(inputs):
     """
     Return a 128-bit BitAverageHaloHash fingerprint in hex from `inputs`
     """
-    inputs = [i.encode('utf-8') for i in inputs if i]
-    bah128 = BitAverageHaloHash(inputs, size_in_bits=128).hexdigest()
+    inputs = [i for i in inputs if i]
+    if inputs:
+        # Inputs are SHA1s or paths and never contain NUL characters: encode
+        # them all at once and split them back apart
+        inputs = '\x00'.join(inputs).encode('utf-8').split(b'\x00')
+    bah128 = BitAverageHaloHash(inputs, size_in_bits=128).digest().hex()
     inputs_count = len(inputs)
-    inputs_count_hex_str = '%08x' % inputs_count
-    bah128 = bah128.decode('utf-8')
-    directory_fingerprint = inputs_count_hex_str + bah128
+    directory_fingerprint = f'{inputs_count:08x}{bah128}'
     return directory_fingerprint
 
 
-def create_content_fingerprint(resources):
+def _get_directory_fingerprint(features, fingerprints_cache=None):
+    """
+    Return a 128-bit BitAverageHaloHash fingerprint in hex from `features`
+
+    `fingerprints_cache` is an optional mapping of fingerprints keyed by a
+    digest of their sorted features. A fingerprint does not depend on the
+    order of its features: directories with the same features, such as
+    duplicated or vendored subtrees, reuse the same cached fingerprint.
+    """
+    if fingerprints_cache is None:
+        return _create_directory_fingerprint(features)
+
+    # Features never contain NUL characters and sorted features joined with
+    # NUL are unique: key the cache on their digest to avoid keeping all the
+    # features of every directory in memory
+    features = sorted(features)
+    key = hashlib.sha256('\x00'.join(features).encode('utf-8')).digest()
+    fingerprint = fingerprints_cache.get(key)
+    if fingerprint is None:
+        fingerprint = _create_directory_fingerprint(features)
+        fingerprints_cache[key] = fingerprint
+    return fingerprint
+
+
+def create_content_fingerprint(resources, fingerprints_cache=None):
     """
     Collect SHA1 strings from a list of Resources (`resources`) and create a
-    directory fingerprint from them
+    directory fingerprint from them, using the optional `fingerprints_cache`
+    mapping of previously computed fingerprints
     """
     features = [r.sha1 for r in resources if r.sha1]
-    return _create_directory_fingerprint(features)
+    return _get_directory_fingerprint(features, fingerprints_cache)
 
 
 def _get_resource_subpath(resource, top):
@@ -59,41 +92,84 @@ def _get_resource_subpath(resource, top):
     return subpath
 
 
-def create_structure_fingerprint(directory, children):
+def create_structure_fingerprint(directory, children, fingerprints_cache=None):
     """
     Collect the subpaths of children Resources of Resource `directory` and
-    create a fingerprint from them
+    create a fingerprint from them, using the optional `fingerprints_cache`
+    mapping of previously computed fingerprints
     """
+    top_path = directory.path
+    top_path_length = len(top_path)
     features = []
     for child in children:
-        if not child.path:
+        child_path = child.path
+        if not child_path:
             continue
-        child_subpath = _get_resource_subpath(child, directory)
-        if not child.size:
-            rounded_child_size = 0
+        if child_path.startswith(top_path):
+            # Same as _get_resource_subpath() for the common case of a child
+            # under `directory`, without partitioning the path
+            child_subpath = child_path[top_path_length:].lstrip('/')
         else:
-            rounded_child_size = int(child.size / 10) * 10
-        path_feature = str(rounded_child_size) + child_subpath
-        features.append(path_feature)
-    return _create_directory_fingerprint(features)
+            child_subpath = _get_resource_subpath(child, directory)
+        rounded_child_size = (child.size or 0) // 10 * 10
+        features.append(f'{rounded_child_size}{child_subpath}')
+    return _get_directory_fingerprint(features, fingerprints_cache)
+
+
+def _iter_directories_with_files(resources):
+    """
+    Yield a tuple of (directory, files) for each directory Resource of
+    `resources`, where `files` is the list of non-empty file Resources found
+    anywhere under that directory.
+
+    `resources` must be walked bottom-up, such that the children of a
+    directory come before that directory: each Resource is visited once and
+    the files of a directory are passed up to its parent directory.
+    """
+    files_by_parent_path = defaultdict(list)
+    for resource in resources:
+        parent_path, _, _ = resource.path.rpartition('/')
+        if resource.is_file:
+            # We do not want to add empty files to our fingerprint
+            if resource.size:
+                files_by_parent_path[parent_path].append(resource)
+            continue
+
+        files = files_by_parent_path.pop(resource.path, [])
+        yield resource, files
+        files_by_parent_path[parent_path].extend(files)
 
 
-def _compute_directory_fingerprints(directory, codebase):
+def _compute_directory_fingerprints(
+    directory,
+    codebase,
+    children=None,
+    fingerprints_cache=None,
+):
     """
     Compute fingerprints for `directory` from `codebase`
+
+    `children` is the list of non-empty file Resources under `directory` and
+    is collected from `codebase` if not provided. `fingerprints_cache` is an
+    optional mapping of fingerprints already computed for other directories.
     """
-    # We do not want to add empty files to our fingerprint
-    children = [r for r in directory.walk(codebase) if r.is_file and r.size]
+    if children is None:
+        # We do not want to add empty files to our fingerprint
+        children = [r for r in directory.walk(codebase) if r.is_file and r.size]
     if len(children) <= 1:
         return
 
-    directory_content_fingerprint = create_content_fingerprint(children)
+    directory_content_fingerprint = create_content_fingerprint(children, fingerprints_cache)
     if hasattr(directory, 'directory_content_fingerprint'):
         directory.directory_content_fingerprint = directory_content_fingerprint
     else:
         directory.extra_data['directory_content'] = directory_content_fingerprint
 
-    directory_structure_fingerprint = create_structure_fingerprint(directory, children)
+    directory_structure_fingerprint = create_structure_fingerprint(
+        directory,
+        children,
+        fingerprints_cache,
+    )
     if hasattr(directory, 'directory_structure_fingerprint'):
         directory.directory_structure_fingerprint = directory_structure_fingerprint
     else:
@@ -107,10 +183,17 @@ def compute_directory_fingerprints(directory, codebase):
     """
     Recursivly compute fingerprints for `directory` from `codebase`
     """
-    for resource in directory.walk(codebase, topdown=False):
-        if resource.is_file:
-            continue
-        _ = _compute_directory_fingerprints(resource, codebase)
+    # Cache fingerprints only for this run, as the cache grows with the size
+    # of the codebase
+    fingerprints_cache = {}
+    resources = directory.walk(codebase, topdown=False)
+    for resource, children in _iter_directories_with_files(resources):
+        _ = _compute_directory_fingerprints(
+            resource,
+            codebase,
+            children,
+            fingerprints_cache,
+        )
     return directory
 
 
@@ -118,10 +201,19 @@ def compute_codebase_directory_fingerprints(codebase):
     """
     Compute fingerprints for directories from `codebase`
     """
-    for resource in codebase.walk(topdown=False):
-        if resource.is_file or not resource.path:
+    # Cache fingerprints only for this run, as the cache grows with the size
+    # of the codebase
+    fingerprints_cache = {}
+    resources = codebase.walk(topdown=False)
+    for resource, children in _iter_directories_with_files(resources):
+        if not resource.path:
             continue
-        _ = _compute_directory_fingerprints(resource, codebase)
+        _ = _compute_directory_fingerprints(
+            resource,
+            codebase,
+            children,
+            fingerprints_cache,
+        )
     return codebase
 
 
@@ -148,15 +240,14 @@ def create_halohash_chunks(bah128):
     Given a 128-bit bah128 hash string, split it into 4 chunks and return those
     chunks as bytearrays
     """
-    chunk1 = bah128[0:8]
-    chunk2 = bah128[8:16]
-    chunk3 = bah128[16:24]
-    chunk4 = bah128[24:32]
+    # Convert the 32 characters of the hash at once: each 8 characters hex
+    # chunk is 4 bytes
+    bah128_bytes = bytearray.fromhex(bah128[:32])
 
-    chunk1 = hexstring_to_binarray(chunk1)
-    chunk2 = hexstring_to_binarray(chunk2)
-    chunk3 = hexstring_to_binarray(chunk3)
-    chunk4 = hexstring_to_binarray(chunk4)
+    chunk1 = bah128_bytes[0:4]
+    chunk2 = bah128_bytes[4:8]
+    chunk3 = bah128_bytes[8:12]
+    chunk4 = bah128_bytes[12:16]
 
     return chunk1, chunk2, chunk3, chunk4
 
@@ -164,6 +255,20 @@ def create_halohash_chunks(bah128):
 # Split on whitespace and punctuations: keep only characters and numbers
 query_pattern = '[^_\\W]+'
 word_splitter = re.compile(query_pattern, re.UNICODE).findall
+# For ASCII-only text, the same pattern over bytes matches the same words
+bytes_word_splitter = re.compile(query_pattern.encode('ascii')).findall
+# Whitespace and ASCII punctuations that are neither word characters nor cased
+# nor case-ignorable: the lowercase of a Greek final sigma depends on the
+# characters around it up to the nearest of these separators
+context_separators = '!"#$%&()*+,-/;<=>?@[\\]_{|}~'
+# Match the characters up to the first separator at the start of a text
+leading_non_separators = re.compile(
+    '[^\\s%s]*' % re.escape(context_separators),
+    re.UNICODE,
+).match
+
+# Size in characters of the chunks used to read files content
+CONTENT_CHUNK_SIZE = 1024 * 1024
 
 
 def _tokenizer(text):
@@ -172,7 +277,8 @@ def _tokenizer(text):
     """
     if not text:
         return []
-    return [token for token in word_splitter(text) if token]
+    # The pattern only matches non-empty words
+    return word_splitter(text)
 
 
 def tokenizer(text):
@@ -195,6 +301,28 @@ def tokenizer(text):
     return _tokenizer(text.lower())
 
 
+def bytes_tokenizer(text):
+    """
+    Return a list of UTF-8 encoded bytes tokens from a unicode text.
+
+    For example::
+    >>> bytes_tokenizer('{{Hi}}some Text with{{noth+-_!@ing}} spAces! + _ -')
+    [b'hi', b'some', b'text', b'with', b'noth', b'ing', b'spaces']
+    >>> bytes_tokenizer('Ünïcode text_ÀÉ')
+    [b'\\xc3\\xbcn\\xc3\\xafcode', b'text', b'\\xc3\\xa0\\xc3\\xa9']
+    """
+    if text.isascii():
+        # Tokenize the encoded text directly and skip encoding each word
+        return bytes_word_splitter(text.encode('ascii').lower())
+
+    words = tokenizer(text)
+    if not words:
+        return []
+    # Words never contain spaces, so we encode them all at once and split
+    # them back apart
+    return ' '.join(words).encode('utf-8').split(b' ')
+
+
 def get_file_fingerprint_hashes(location, ngram_length=8, **kwargs):
     """
     Return a mapping of fingerprint hashes for the file at `location`
@@ -215,38 +343,125 @@ def get_file_fingerprint_hashes(location, ngram_length=8, **kwargs):
     if not (filetype.is_file(location) and ft.is_text):
         return {}
 
-    with open(location) as f:
-        content = f.read()
+    # Each word is at least one character long and words are separated by at
+    # least one character: smaller files cannot contain a single ngram
+    if os.path.getsize(location) < 2 * ngram_length - 1:
+        return dict(
+            halo1=None
+        )
 
-    file_fingerprint = create_file_fingerprint(
-        content,
-        ngram_length=ngram_length
-    )
+    with open(location) as f:
+        # Read and fingerprint the file content in chunks to avoid loading
+        # large files in memory at once
+        chunks = iter(partial(f.read, CONTENT_CHUNK_SIZE), '')
+        file_fingerprint = create_file_fingerprint(
+            chunks,
+            ngram_length=ngram_length
+        )
     return dict(
         halo1=file_fingerprint
     )
 
 
+def batch_file_fingerprints(locations, ngram_length=8, workers=None):
+    """
+    Return a list of mappings of fingerprint hashes for the files at
+    `locations`, in the same order as `locations`.
+
+    Files are fingerprinted in parallel using `workers` processes, or the
+    default number of processes of a ProcessPoolExecutor if `workers` is not
+    provided.
+    """
+    get_hashes = partial(get_file_fingerprint_hashes, ngram_length=ngram_length)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(get_hashes, locations, chunksize=32))
+
+
+def ngrams(words, ngram_length):
+    """
+    Return an iterable of ngrams of length `ngram_length` given a list of
+    `words`. Each ngram is a tuple of `ngram_length` words.
+
+    The returned iterable is empty if `words` contains less than
+    `ngram_length` words.
+
+    For example::
+    >>> list(ngrams([1, 2, 3, 4, 5], 2))
+    [(1, 2), (2, 3), (3, 4), (4, 5)]
+    >>> list(ngrams([1, 2, 3, 4, 5], 4))
+    [(1, 2, 3, 4), (2, 3, 4, 5)]
+    >>> list(ngrams([1], 2))
+    []
+    """
+    # Zip `ngram_length` offset views of `words` without copying the list
+    return zip(*(islice(words, i, None) for i in range(ngram_length)))
+
+
+def iter_chunks_words(chunks):
+    """
+    Yield lists of UTF-8 encoded bytes tokens from an iterable of unicode text
+    `chunks`. Words cut across two chunks are kept whole.
+
+    Chunks are only split after whitespace or a `context_separators`
+    character: lowercasing is context-sensitive for the Greek final sigma and
+    these characters are neither cased nor case-ignorable, so each text is
+    lowercased as in the whole content.
+
+    For example::
+    >>> list(iter_chunks_words(['some Te', 'xt with', '  spAces', '!']))
+    [[b'some'], [b'text'], [b'with'], [b'spaces']]
+    >>> list(iter_chunks_words(['{"some":"Te', 'xt","with":', '"spAces"}']))
+    [[b'some'], [b'text', b'with'], [b'spaces']]
+    """
+    carry = ''
+    for chunk in chunks:
+        # The text after the last separator of this chunk may continue in the
+        # next chunk: carry it over and tokenize it with the next chunk
+        tail_length = leading_non_separators(chunk[::-1]).end()
+        if tail_length == len(chunk):
+            carry += chunk
+            continue
+        cut = len(chunk) - tail_length
+        text = carry + chunk[:cut]
+        carry = chunk[cut:]
+        yield bytes_tokenizer(text)
+
+    if carry:
+        yield bytes_tokenizer(carry)
+
+
 def create_content_hash(content, ngram_length=8):
     """
     Return a 128-bit BitAverageHaloHash from file `content` and the number of
     ngrams inserted into the hash
-    """
-    from licensedcode.tokenize import ngrams
 
-    # Break content into words, then create ngrams from words
-    words = tokenizer(content)
-    ngs = ngrams(words, ngram_length)
+    `content` is either a unicode text or an iterable of unicode text chunks.
+    """
+    if isinstance(content, str):
+        content = [content]
+
+    content_hash = BitAverageHaloHash()
+    ngs_count = 0
+    # The last words of a chunk start ngrams that end in the next chunk
+    previous_words = []
+    # Break content into words, converted to bytes once as each word is
+    # shared by up to `ngram_length` ngrams
+    for words in iter_chunks_words(content):
+        words = previous_words + words
+        if len(words) < ngram_length:
+            previous_words = words
+            continue
 
-    # Convert each list of ngrams to a sequence of bytes
-    ngs_bytes = [[g.encode('utf-8') for g in ng] for ng in ngs]
+        # Create ngrams from words and join each ngram into a single bytestring
+        ngs_bytes = list(map(b''.join, ngrams(words, ngram_length)))
+        content_hash.update(ngs_bytes)
+        ngs_count += len(ngs_bytes)
 
-    # Join all ngrams into a single bytearray
-    ngs_bytes = [b''.join(ng) for ng in ngs_bytes]
+        previous_words = words[max(len(words) - ngram_length + 1, 0):]
 
-    # Create fingerprints and return fingerprint hashes
-    if ngs_bytes:
-        return BitAverageHaloHash(ngs_bytes), len(ngs_bytes)
+    # Return fingerprint hashes
+    if ngs_count:
+        return content_hash, ngs_count
     else:
         return None, 0
 
@@ -254,6 +469,8 @@ def create_content_hash(content, ngram_length=8):
 def create_file_fingerprint(content, ngram_length=8):
     """
     Return a 128-bit BitAverageHaloHash fingerprint in hex from file `content`
+
+    `content` is either a unicode text or an iterable of unicode text chunks.
     """
     # Create fingerprint
     content_hash, ngs_count = create_content_hash(
@@ -261,7 +478,6 @@ def create_file_fingerprint(content, ngram_length=8):
         ngram_length=ngram_length
     )
     if content_hash:
-        content_fingerprint = content_hash.hexdigest().decode('utf-8')
-        ngs_count_hex_str = '%08x' % ngs_count
-        file_fingerprint = ngs_count_hex_str + content_fingerprint
+        content_fingerprint = content_hash.digest().hex()
+        file_fingerprint = f'{ngs_count:08x}{content_fingerprint}'
         return file_fingerprint
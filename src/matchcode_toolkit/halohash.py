@@ -8,6 +8,7 @@
 #
 
 import binascii
+from collections import Counter
 
 from bitarray import bitarray
 from bitarray.util import count_xor
@@ -191,11 +192,26 @@ class BitAverageHaloHash(object):
         if not msg:
             return
         if isinstance(msg, (list, tuple,)):
-            for m in msg:
-                self.__hashup(m)
+            self.__hashup_all(msg)
         else:
             self.__hashup(msg)
 
+    def __hashup_all(self, msgs):
+        """
+        Add all the bytestrings in the `msgs` sequence to the hash at once.
+
+        The hashes of `msgs` are concatenated and the bits set in each column
+        are counted in bulk rather than looping over every bit of every hash.
+        """
+        assert all(isinstance(m, bytes) for m in msgs)
+        hashmodule = self.hashmodule
+        digests = b''.join(hashmodule(m).digest() for m in msgs)
+        msgs_count = len(msgs)
+        columns = self.columns
+        for i, bits_count in enumerate(count_column_bits(digests, self.size_in_bits)):
+            # Each set bit subtracts 1 from its column and each unset bit adds 1
+            columns[i] += msgs_count - 2 * bits_count
+
     def __hashup(self, msg):
         assert isinstance(msg, bytes)
         hsh = self.hashmodule(msg).digest()
@@ -251,6 +267,46 @@ class BitAverageHaloHash(object):
         return b
 
 
+# Positions of the bits set in each byte value, most significant bit first
+BYTE_SET_BITS = [
+    tuple(i for i in range(8) if value & (0x80 >> i)) for value in range(256)
+]
+
+# Number of hashes above which counting column bits from byte value histograms
+# is faster than counting them from bit slices
+HISTOGRAM_MIN_HASHES_COUNT = 2048
+
+
+def count_column_bits(digests, size_in_bits):
+    """
+    Return a list of the number of bits set at each of the `size_in_bits`
+    positions (or columns) of the hashes concatenated in the `digests` bytes.
+
+    For example:
+    >>> count_column_bits(bytes([0b10000001, 0b11000000, 0b10000000]), 8)
+    [3, 1, 0, 0, 0, 0, 0, 1]
+    >>> count_column_bits(bytes([0b10000001, 0b11000000] * 2048), 16)
+    [2048, 0, 0, 0, 0, 0, 0, 2048, 2048, 2048, 0, 0, 0, 0, 0, 0]
+    """
+    digest_size = size_in_bits // 8
+    if len(digests) < HISTOGRAM_MIN_HASHES_COUNT * digest_size:
+        # The bits of a column are every `size_in_bits` bit starting at the
+        # column position
+        bits = bitarray_from_bytes(digests)
+        return [bits[i::size_in_bits].count(1) for i in range(size_in_bits)]
+
+    # For many hashes, count the values of each byte of the hashes instead and
+    # add the count of each byte value to the columns of its set bits
+    bits_counts = [0] * size_in_bits
+    for byte_index in range(digest_size):
+        byte_values = Counter(digests[byte_index::digest_size])
+        column = byte_index * 8
+        for value, value_count in byte_values.items():
+            for bit in BYTE_SET_BITS[value]:
+                bits_counts[column + bit] += value_count
+    return bits_counts
+
+
 def bitarray_from_bytes(b):
     """
     Return a bitarray built from a byte string b.
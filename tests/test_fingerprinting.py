@@ -8,17 +8,23 @@
 #
 
 import os
+from unittest import mock
 
 from commoncode.resource import VirtualCodebase
 from commoncode.testcase import FileBasedTesting
 
+from matchcode_toolkit import fingerprinting
 from matchcode_toolkit.fingerprinting import _create_directory_fingerprint
 from matchcode_toolkit.fingerprinting import _get_resource_subpath
+from matchcode_toolkit.fingerprinting import batch_file_fingerprints
 from matchcode_toolkit.fingerprinting import compute_codebase_directory_fingerprints
+from matchcode_toolkit.fingerprinting import compute_directory_fingerprints
 from matchcode_toolkit.fingerprinting import create_content_fingerprint
+from matchcode_toolkit.fingerprinting import create_file_fingerprint
 from matchcode_toolkit.fingerprinting import create_halohash_chunks
 from matchcode_toolkit.fingerprinting import create_structure_fingerprint
 from matchcode_toolkit.fingerprinting import get_file_fingerprint_hashes
+from matchcode_toolkit.fingerprinting import iter_chunks_words
 from matchcode_toolkit.fingerprinting import split_fingerprint
 from matchcode_toolkit.halohash import byte_hamming_distance
 
@@ -67,6 +73,9 @@ class TestFingerprintingFunctions(FileBasedTesting):
         expected_fingerprint = '00000004005b88c2800f0044044781ae05680419'
         self.assertEqual(expected_fingerprint, fingerprint)
 
+        fingerprint = create_content_fingerprint(reversed(test_resources))
+        self.assertEqual(expected_fingerprint, fingerprint)
+
     def test__get_resource_subpath(self):
         test_resource = Resource(path='foo/bar/baz/qux.c')
         test_top_resource = Resource(path='foo/bar/')
@@ -97,6 +106,10 @@ class TestFingerprintingFunctions(FileBasedTesting):
         self.assertEqual(chunk3, expected_chunk3)
         self.assertEqual(chunk4, expected_chunk4)
 
+        # Only the first 32 characters of the hash are used
+        chunks = create_halohash_chunks(test_bah128 + '00ff')
+        self.assertEqual((chunk1, chunk2, chunk3, chunk4), chunks)
+
     def test_compute_codebase_directory_fingerprints(self):
         scan_loc = self.get_test_loc('abbrev-1.0.3-i.json')
         vc = VirtualCodebase(location=scan_loc)
@@ -108,6 +121,122 @@ class TestFingerprintingFunctions(FileBasedTesting):
         self.assertEqual(expected_directory_content, directory_content)
         self.assertEqual(expected_directory_structure, directory_structure)
 
+    def test_compute_codebase_directory_fingerprints_reuses_duplicated_subtree_fingerprints(self):
+        foo_sha1 = 'd4e4abbe8e2a8169d6a52907152c2c80ec884745'
+        bar_sha1 = '0c94f137f6e0536db8cb2622a9dc84253b91b90c'
+        scan_data = dict(files=[
+            dict(path='project', type='directory'),
+            dict(path='project/lib1', type='directory'),
+            dict(path='project/lib1/foo.c', type='file', size=771, sha1=foo_sha1),
+            dict(path='project/lib1/bar.c', type='file', size=608, sha1=bar_sha1),
+            dict(path='project/lib2', type='directory'),
+            dict(path='project/lib2/foo.c', type='file', size=771, sha1=foo_sha1),
+            dict(path='project/lib2/bar.c', type='file', size=608, sha1=bar_sha1),
+        ])
+        vc = VirtualCodebase(location=scan_data)
+        with mock.patch.object(
+            fingerprinting,
+            '_create_directory_fingerprint',
+            wraps=fingerprinting._create_directory_fingerprint,
+        ) as create_fingerprint:
+            vc = compute_codebase_directory_fingerprints(vc)
+
+        # The content and structure fingerprints of lib2 are reused from lib1:
+        # fingerprints are only created for lib1 (content and structure) and
+        # for project (content and structure)
+        self.assertEqual(4, create_fingerprint.call_count)
+        lib1 = vc.get_resource('project/lib1')
+        lib2 = vc.get_resource('project/lib2')
+        self.assertEqual(lib1.extra_data, lib2.extra_data)
+        self.assertEqual(
+            create_content_fingerprint(lib2.walk(vc)),
+            lib2.extra_data['directory_content'],
+        )
+        self.assertEqual(
+            create_structure_fingerprint(lib2, lib2.walk(vc)),
+            lib2.extra_data['directory_structure'],
+        )
+
+    def test_compute_directory_fingerprints_of_subdirectory(self):
+        scan_data = dict(files=[
+            dict(path='project', type='directory'),
+            dict(path='project/src', type='directory'),
+            dict(path='project/src/lib', type='directory'),
+            dict(path='project/src/lib/core', type='directory'),
+            dict(
+                path='project/src/lib/core/foo.c',
+                type='file',
+                size=771,
+                sha1='5ea95ca114c9233232c0f7b5b1b7b4ec4ee09d0f',
+            ),
+            dict(
+                path='project/src/lib/core/bar.c',
+                type='file',
+                size=608,
+                sha1='cc1b8dc624881a610ba6d0e05bc3464aafa80c8f',
+            ),
+            dict(
+                path='project/src/lib/baz.c',
+                type='file',
+                size=1024,
+                sha1='c9509843ed40b5bd0cd590f8676d43062c18e661',
+            ),
+            dict(
+                path='project/src/main.c',
+                type='file',
+                size=321,
+                sha1='3a576e09615c0e19842e5f3ac31e858c9ae7fe41',
+            ),
+            dict(path='project/docs', type='directory'),
+            dict(
+                path='project/docs/README',
+                type='file',
+                size=123,
+                sha1='9a2a2c44785de6af318fbc99922cc21d93d4a17d',
+            ),
+            dict(
+                path='project/docs/NOTICE',
+                type='file',
+                size=456,
+                sha1='047b6ae3c6a58cac61106d02020a16e392e88f08',
+            ),
+        ])
+        vc = VirtualCodebase(location=scan_data)
+        src = vc.get_resource('project/src')
+        compute_directory_fingerprints(src, vc)
+
+        core = vc.get_resource('project/src/lib/core')
+        core_files = [r for r in core.walk(vc) if r.is_file]
+        self.assertEqual(2, len(core_files))
+        self.assertEqual(
+            create_content_fingerprint(core_files),
+            core.extra_data['directory_content'],
+        )
+        self.assertEqual(
+            create_structure_fingerprint(core, core_files),
+            core.extra_data['directory_structure'],
+        )
+
+        # The files of lib/core are also part of the fingerprints of lib
+        lib = vc.get_resource('project/src/lib')
+        lib_files = [r for r in lib.walk(vc) if r.is_file]
+        self.assertEqual(3, len(lib_files))
+        self.assertEqual(
+            create_content_fingerprint(lib_files),
+            lib.extra_data['directory_content'],
+        )
+        self.assertEqual(
+            create_structure_fingerprint(lib, lib_files),
+            lib.extra_data['directory_structure'],
+        )
+        indexed_elements_count, _ = split_fingerprint(lib.extra_data['directory_content'])
+        self.assertEqual(3, indexed_elements_count)
+
+        # Only the directories under `src` have fingerprints computed
+        self.assertEqual({}, vc.get_resource('project/src').extra_data)
+        self.assertEqual({}, vc.get_resource('project/docs').extra_data)
+        self.assertEqual({}, vc.root.extra_data)
+
     def test_do_not_compute_fingerprint_for_empty_dirs(self):
         scan_loc = self.get_test_loc('test.json')
         vc = VirtualCodebase(location=scan_loc)
@@ -170,3 +299,67 @@ class TestFingerprintingFunctions(FileBasedTesting):
         assert result2_fingerprint == expected_result2_fingerprint
 
         assert byte_hamming_distance(result1_fingerprint, result2_fingerprint) == 3
+
+    def test_batch_file_fingerprints(self):
+        test_files = [
+            self.get_test_loc('inflate.c'),
+            self.get_test_loc('inflate-mod.c'),
+            self.get_test_loc('inflate-mod2.c'),
+        ]
+        results = batch_file_fingerprints(test_files, workers=2)
+        expected_results = [get_file_fingerprint_hashes(f) for f in test_files]
+        assert results == expected_results
+
+    def test_create_file_fingerprint_from_chunks(self):
+        test_file = self.get_test_loc('inflate.c')
+        with open(test_file) as f:
+            content = f.read()
+        expected_fingerprint = create_file_fingerprint(content)
+        for chunk_size in [1, 7, 100, 4096]:
+            chunks = (content[i:i + chunk_size] for i in range(0, len(content), chunk_size))
+            fingerprint = create_file_fingerprint(chunks)
+            self.assertEqual(expected_fingerprint, fingerprint)
+
+    def test_iter_chunks_words_without_whitespace(self):
+        # Content without whitespace is not buffered until the end
+        chunks = [f'"key{i}":"va' + f'lue{i}",' for i in range(1000)]
+        chunks = [''.join(chunks[i:i + 10]) for i in range(0, len(chunks), 10)]
+        words = list(iter_chunks_words(chunks))
+        self.assertEqual(len(chunks), len(words))
+        for i, chunk_words in enumerate(words):
+            expected_words = []
+            for j in range(i * 10, i * 10 + 10):
+                expected_words.extend([b'key%d' % j, b'value%d' % j])
+            self.assertEqual(expected_words, chunk_words)
+
+        chunks = ['{"some":"Te', 'xt","with":"spA', 'ces"}']
+        expected_words = [[b'some'], [b'text', b'with'], [b'spaces']]
+        self.assertEqual(expected_words, list(iter_chunks_words(chunks)))
+
+    def test_create_file_fingerprint_from_chunks_with_context_sensitive_lowercase(self):
+        # The lowercase of a Greek capital sigma depends on the characters
+        # around it, including across non-word characters
+        content = 'one two three four five six seven eight ΑΣ.Β nine ΑΒ.Σ ten eleven twelve'
+        expected_fingerprint = create_file_fingerprint(content)
+        for i in range(1, len(content)):
+            fingerprint = create_file_fingerprint([content[:i], content[i:]])
+            self.assertEqual(expected_fingerprint, fingerprint)
+
+    def test_get_file_fingerprint_hashes_small_file(self):
+        # 14 bytes is too small to contain 8 words
+        test_file = self.get_temp_file('txt')
+        with open(test_file, 'w') as f:
+            f.write('a b c d e f gh')
+        with mock.patch.object(fingerprinting, 'create_file_fingerprint') as create_fingerprint:
+            result = get_file_fingerprint_hashes(test_file)
+        create_fingerprint.assert_not_called()
+        self.assertEqual(dict(halo1=None), result)
+
+    def test_get_file_fingerprint_hashes_smallest_file_with_an_ngram(self):
+        # 15 bytes is the smallest file that contains 8 words
+        test_file = self.get_temp_file('txt')
+        with open(test_file, 'w') as f:
+            f.write('a b c d e f g h')
+        result = get_file_fingerprint_hashes(test_file)
+        indexed_elements_count, _ = split_fingerprint(result['halo1'])
+        self.assertEqual(1, indexed_elements_count)
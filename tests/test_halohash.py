@@ -8,6 +8,7 @@
 #
 
 from collections import defaultdict
+from itertools import product
 
 import csv
 import math
@@ -196,3 +197,17 @@ class TestHalohash(FileBasedTesting):
 
             expected_results_loc = self.get_test_loc(f'{number_of_words}-replaced-expected-results.csv')
             check_results(results, expected_results_loc, ['words replaced', 'mean hamming distance', 'standard deviation'], regen=regen)
+
+    def test_halohash_update_with_sequence_matches_single_updates(self):
+        # Check both fewer and more hashes than HISTOGRAM_MIN_HASHES_COUNT
+        small_content = self.original_content[:500]
+        large_content = [b'%d%s' % (i, w) for i, w in enumerate(small_content * 6)]
+        contents = [small_content, large_content]
+        sizes_in_bits = [32, 64, 128, 160, 256, 512]
+        for content, size_in_bits in product(contents, sizes_in_bits):
+            batch_hash = halohash.BitAverageHaloHash(content, size_in_bits=size_in_bits)
+            single_hash = halohash.BitAverageHaloHash(size_in_bits=size_in_bits)
+            for word in content:
+                single_hash.update(word)
+            assert batch_hash.columns == single_hash.columns
+            assert batch_hash.hexdigest() == single_hash.hexdigest()